@@ -1,27 +1,396 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, send_from_directory, g, has_request_context
 import os
+import sys
 import json
 import time
+import hmac
+import uuid
+import copy
+import queue
+import atexit
 import logging
+import logging.handlers
+import tempfile
+import threading
+import functools
+import contextlib
 import google.generativeai as genai  # SDK для Gemini API
 from flask_cors import CORS
 from serpapi import GoogleSearch
 from retry import retry
 import requests
 from bs4 import BeautifulSoup
+from datetime import datetime, timezone
 import random
 import re
 
 # Налаштування логування
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')  # 'text' або 'json'
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+TEXT_LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] - %(message)s'
+
+def _parse_sample_rates(value):
+    """
+    Розбір частот семплування подій логування
+
+    :param value: рядок виду 'trends.cache_hit=0.1,serpapi.request=0.5'
+    :return: словник подія -> частка записів, що логуються
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        event, _, rate = item.partition('=')
+        rates[event.strip()] = float(rate)
+    return rates
+
+LOG_SAMPLE_RATES = _parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', ''))
+
+class RequestContextFilter(logging.Filter):
+    """Додає до записів request_id поточного запиту"""
+    def filter(self, record):
+        record.request_id = g.get('request_id', '-') if has_request_context() else '-'
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """Форматування записів у JSON, по одному об'єкту на рядок"""
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, 'request_id', '-'),
+            "message": record.getMessage()
+        }
+        event = getattr(record, 'event', None)
+        if event is not None:
+            entry["event"] = event
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler, що в потоці запиту лише фіксує текст повідомлення.
+    Аргументи та traceback перетворюються на рядки одразу, щоб не
+    тримати живі об'єкти до обробки, а форматування (час, JSON) і запис
+    у потік виконує фоновий QueueListener.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_log_listener = None
+
+@atexit.register
+def _stop_log_listener():
+    """Зупинити фоновий запис, дописавши записи, що залишились у черзі"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+def configure_logging(log_format=LOG_FORMAT, level=LOG_LEVEL, stream=None, sample_rates=None):
+    """
+    Налаштування кореневого логера: фільтр контексту запиту та черга
+    з фоновим записом у потік
+
+    :param log_format: 'text' або 'json'
+    :param level: рівень логування
+    :param stream: потік для запису (default: sys.stderr)
+    :param sample_rates: частоти семплування подій для log_event (default: з LOG_SAMPLE_RATES)
+    :return: запущений QueueListener
+    """
+    global _log_listener, LOG_SAMPLE_RATES
+    _stop_log_listener()
+    if sample_rates is not None:
+        LOG_SAMPLE_RATES = sample_rates
+
+    stream_handler = logging.StreamHandler(stream)
+    if log_format == 'json':
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(TEXT_LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _log_listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _log_listener.start()
+    return _log_listener
+
+configure_logging()
 logger = logging.getLogger("TrendAnalyzer")
 
+def log_event(event, level, msg, *args):
+    """
+    Запис події з урахуванням частоти семплування з LOG_SAMPLE_RATES.
+    Семплування лише зменшує обсяг логу; рішення приймається до створення
+    запису, тому відкинута подія нічого не форматує.
+
+    :param event: назва події (наприклад, 'trends.cache_hit')
+    :param level: рівень логування
+    :param msg: повідомлення у %-форматі
+    :param args: аргументи повідомлення
+    """
+    if not logger.isEnabledFor(level):
+        return
+    rate = LOG_SAMPLE_RATES.get(event, 1.0)
+    if rate < 1.0 and random.random() >= rate:
+        return
+    logger.log(level, msg, *args, extra={'event': event}, stacklevel=2)
+
+# Налаштування профілювання запитів (за замовчуванням вимкнено)
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', '0.005'))  # 5 мс між семплами
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'trend_profiles'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', '50'))
+PROFILING_ENABLED = bool(PROFILE_ADMIN_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+# Профіль поточного запиту (окремий для кожного потоку)
+_profile_local = threading.local()
+_NULL_SPAN = contextlib.nullcontext()
+
+class RequestProfile:
+    """
+    Профіль одного запиту: семплер стеків викликів та дерево етапів (spans)
+    """
+    def __init__(self, name, interval=PROFILE_INTERVAL):
+        """
+        :param name: назва профілю (метод і шлях запиту)
+        :param interval: інтервал між семплами стеку в секундах
+        """
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+
+        # Семпли стеків: кортеж фреймів (від кореня до листа) -> кількість
+        self.samples = {}
+        # Події дерева етапів: (тип 'O'/'C', мітка, час у секундах від початку)
+        self.events = []
+        self._depth = 0
+        # Невдала спроба функції під @retry, після якої буде наступна:
+        # (функція, глибина, час завершення, номер спроби)
+        self._pending_retry = None
+
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_loop, name="profile-sampler", daemon=True)
+
+    def start(self):
+        """Запустити семплер"""
+        self._sampler.start()
+
+    def stop(self):
+        """Зупинити семплер та зафіксувати тривалість запиту"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._sampler.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _sample_loop(self):
+        """Періодично знімає стек потоку, що обробляє запит"""
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                key = tuple(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+    def open_span(self, name, retry_key=None):
+        """
+        Відкрити етап. Якщо попередня спроба тієї ж функції під @retry
+        завершилась помилкою і ще не вичерпала спроби, цей етап - наступна
+        спроба, а проміжок між ними записується як окремий етап очікування.
+
+        :param name: назва етапу
+        :param retry_key: функція під @retry (None для звичайних етапів)
+        :return: мітка етапу та номер спроби
+        """
+        now = time.perf_counter() - self.started
+        attempt = 1
+        pending, self._pending_retry = self._pending_retry, None
+        if retry_key is not None and pending is not None:
+            pending_key, depth, failed_at, failed_attempt = pending
+            if pending_key is retry_key and depth == self._depth:
+                attempt = failed_attempt + 1
+                sleep_label = f"retry.sleep ({name})"
+                self.events.append(('O', sleep_label, failed_at))
+                self.events.append(('C', sleep_label, now))
+
+        label = name if attempt == 1 else f"{name} [attempt {attempt}]"
+        self.events.append(('O', label, now))
+        self._depth += 1
+        return label, attempt
+
+    def close_span(self, label, attempt, failed=False, retry_key=None, retry_tries=0):
+        """
+        Закрити етап
+
+        :param label: мітка, повернута open_span
+        :param attempt: номер спроби
+        :param failed: чи завершився етап винятком
+        :param retry_key: функція під @retry (None для звичайних етапів)
+        :param retry_tries: кількість спроб, заданих у @retry
+        """
+        now = time.perf_counter() - self.started
+        self._depth -= 1
+        self.events.append(('C', label, now))
+        if retry_key is not None and failed and attempt < retry_tries:
+            self._pending_retry = (retry_key, self._depth, now, attempt)
+        else:
+            self._pending_retry = None
+
+    def to_speedscope(self):
+        """
+        Сформувати профіль у форматі speedscope: дерево етапів (evented)
+        та семпли стеків (sampled)
+
+        :return: словник, готовий до серіалізації в JSON
+        """
+        frames = []
+        frame_index = {}
+
+        def frame_id(name):
+            if name not in frame_index:
+                frame_index[name] = len(frames)
+                frames.append({"name": name})
+            return frame_index[name]
+
+        end_ms = self.duration * 1000
+        span_events = [
+            {"type": kind, "frame": frame_id(label), "at": at * 1000}
+            for kind, label, at in self.events
+        ]
+        samples = []
+        weights = []
+        for stack, count in self.samples.items():
+            samples.append([frame_id(name) for name in stack])
+            weights.append(count * self.interval * 1000)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "youtube-trend-analyzer",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "evented",
+                    "name": f"{self.name} - етапи",
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": end_ms,
+                    "events": span_events
+                },
+                {
+                    "type": "sampled",
+                    "name": f"{self.name} - семпли",
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": end_ms,
+                    "samples": samples,
+                    "weights": weights
+                }
+            ]
+        }
+
+    def to_collapsed(self):
+        """
+        Сформувати семпли у форматі collapsed stacks (flamegraph.pl, speedscope)
+
+        :return: текст, по одному стеку на рядок
+        """
+        lines = [f"{';'.join(stack)} {count}" for stack, count in self.samples.items()]
+        return "\n".join(lines) + "\n"
+
+    def save(self, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        """
+        Зберегти профіль у файли та видалити найстаріші профілі понад ліміт
+
+        :param directory: каталог для профілів
+        :param keep: скільки останніх профілів зберігати
+        """
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{self.id}.speedscope.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.to_speedscope(), f, ensure_ascii=False)
+        with open(os.path.join(directory, f"{self.id}.collapsed.txt"), 'w', encoding='utf-8') as f:
+            f.write(self.to_collapsed())
+
+        profile_ids = sorted({name.split('.', 1)[0] for name in os.listdir(directory)})
+        for old_id in profile_ids[:-keep] if keep > 0 else []:
+            for suffix in ('.speedscope.json', '.collapsed.txt'):
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(directory, old_id + suffix))
+
+        logger.info("Профіль запиту %s збережено як %s (%.1f мс)", self.name, self.id, self.duration * 1000)
+
+@contextlib.contextmanager
+def _profiled_span(profile, name, retry_key=None, retry_tries=0):
+    """Записує етап у профіль, позначаючи невдалі спроби функцій під @retry"""
+    label, attempt = profile.open_span(name, retry_key)
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        profile.close_span(label, attempt, failed, retry_key, retry_tries)
+
+def profile_span(name):
+    """
+    Контекстний менеджер для етапу запиту. Без активного профілю
+    повертає спільний порожній контекст.
+
+    :param name: назва етапу
+    """
+    profile = getattr(_profile_local, 'profile', None)
+    if profile is None:
+        return _NULL_SPAN
+    return _profiled_span(profile, name)
+
+def profiled(name, retry_tries=0):
+    """
+    Декоратор, що записує кожен виклик функції як етап профілю.
+    Для функцій під @retry розміщується під ним з тим самим значенням
+    tries, щоб кожна спроба та очікування між ними були окремими етапами.
+
+    :param name: назва етапу
+    :param retry_tries: значення tries у @retry (0 - функція не повторюється)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = getattr(_profile_local, 'profile', None)
+            if profile is None:
+                return func(*args, **kwargs)
+            retry_key = wrapper if retry_tries > 1 else None
+            with _profiled_span(profile, name, retry_key, retry_tries):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
 class GoogleTrendsClient:
     """
     Клієнт для отримання трендових пошуків через SerpAPI
@@ -84,6 +453,7 @@ class GoogleTrendsClient:
         logger.info(f"Ініціалізовано клієнт для SerpAPI з мовою {language} та регіоном {geo}")
 
     @retry(tries=3, delay=2, backoff=2)
+    @profiled("serpapi.trending_searches", retry_tries=3)
     def get_trending_searches(self, count=20):
         """
         Отримати список трендових пошуків з Google Trends через SerpAPI
@@ -95,7 +465,7 @@ class GoogleTrendsClient:
         all_trends = []
         
         try:
-            logger.info("Отримання трендів через SerpAPI")
+            log_event('serpapi.request', logging.INFO, "Отримання трендів через SerpAPI")
             
             # Параметри для запиту до SerpAPI - Daily Trending Searches
             params = {
@@ -108,9 +478,10 @@ class GoogleTrendsClient:
             
             # Запит до SerpAPI
             search = GoogleSearch(params)
-            results = search.get_dict()
+            with profile_span("serpapi.request"):
+                results = search.get_dict()
             
-            logger.info(f"Отримано відповідь від SerpAPI: {results.keys()}")
+            log_event('serpapi.response', logging.DEBUG, "Отримано відповідь від SerpAPI: %s", results.keys())
             
             # Обробка результатів
             if "trending_searches" in results:
@@ -131,7 +502,8 @@ class GoogleTrendsClient:
                 }
                 
                 search = GoogleSearch(params)
-                results = search.get_dict()
+                with profile_span("serpapi.request"):
+                    results = search.get_dict()
                 
                 if "real_time_trends" in results:
                     trends = results["real_time_trends"]
@@ -156,7 +528,8 @@ class GoogleTrendsClient:
                     }
                     
                     search = GoogleSearch(params)
-                    results = search.get_dict()
+                    with profile_span("serpapi.request"):
+                        results = search.get_dict()
                     
                     if "trending_searches" in results:
                         trending = results["trending_searches"]
@@ -169,7 +542,7 @@ class GoogleTrendsClient:
             
             # Якщо тренди отримано, повертаємо їх
             if unique_trends:
-                logger.info(f"Отримано {len(unique_trends)} унікальних трендів через SerpAPI")
+                logger.info("Отримано %d унікальних трендів через SerpAPI", len(unique_trends))
                 result = unique_trends[:count] if len(unique_trends) > count else unique_trends
                 return result
             
@@ -177,13 +550,14 @@ class GoogleTrendsClient:
             logger.warning("Не вдалося отримати тренди через SerpAPI, використовуємо запасний список")
             
         except Exception as e:
-            logger.error(f"Помилка при отриманні трендів через SerpAPI: {str(e)}")
+            logger.error("Помилка при отриманні трендів через SerpAPI: %s", e)
             
         # Повертаємо запасний список, якщо не вдалося отримати тренди через API
         fallback_result = random.sample(self.fallback_trends, min(count, len(self.fallback_trends)))
-        logger.info(f"Використано {len(fallback_result)} трендів із запасного списку")
+        logger.info("Використано %d трендів із запасного списку", len(fallback_result))
         return fallback_result
     
+    @profiled("serpapi.related_queries")
     def get_related_queries(self, keyword):
         """
         Отримати пов'язані запити для заданого ключового слова через SerpAPI
@@ -192,7 +566,7 @@ class GoogleTrendsClient:
         :return: словник з топовими та зростаючими запитами
         """
         try:
-            logger.info(f"Пошук пов'язаних запитів для '{keyword}' через SerpAPI")
+            log_event('serpapi.request', logging.INFO, "Пошук пов'язаних запитів для '%s' через SerpAPI", keyword)
             
             # Параметри для запиту до SerpAPI
             params = {
@@ -207,7 +581,8 @@ class GoogleTrendsClient:
             
             # Запит до SerpAPI
             search = GoogleSearch(params)
-            results = search.get_dict()
+            with profile_span("serpapi.request"):
+                results = search.get_dict()
             
             top_queries = []
             rising_queries = []
@@ -228,13 +603,13 @@ class GoogleTrendsClient:
                         if "query" in query:
                             rising_queries.append(query["query"])
             
-            logger.info(f"Знайдено {len(top_queries)} топових та {len(rising_queries)} зростаючих запитів")
+            logger.info("Знайдено %d топових та %d зростаючих запитів", len(top_queries), len(rising_queries))
             
-            # Логуємо приклади запитів
+            # Логуємо приклади запитів (лише на рівні debug)
             if top_queries:
-                logger.info(f"Пов'язані топові запити: {top_queries[:5]}")
+                log_event('serpapi.related_queries', logging.DEBUG, "Пов'язані топові запити: %s", top_queries[:5])
             if rising_queries:
-                logger.info(f"Пов'язані зростаючі запити: {rising_queries[:5]}")
+                log_event('serpapi.related_queries', logging.DEBUG, "Пов'язані зростаючі запити: %s", rising_queries[:5])
             
             # Якщо знайшли достатньо пов'язаних запитів, повертаємо їх
             if top_queries or rising_queries:
@@ -244,11 +619,11 @@ class GoogleTrendsClient:
                 }
             
             # Якщо не знайшли через SerpAPI, генеруємо пов'язані запити на основі ключового слова
-            logger.info(f"Генерація пов'язаних запитів для '{keyword}'")
+            logger.info("Генерація пов'язаних запитів для '%s'", keyword)
             return self._generate_related_queries(keyword)
             
         except Exception as e:
-            logger.error(f"Помилка при отриманні пов'язаних запитів: {str(e)}")
+            logger.error("Помилка при отриманні пов'язаних запитів: %s", e)
             # У випадку помилки генеруємо запити
             return self._generate_related_queries(keyword)
     
@@ -413,6 +788,7 @@ class TrendAnalyzer:
             logger.error(f"Помилка ініціалізації моделі Gemini: {str(e)}")
             raise
     
+    @profiled("analyzer.trending_searches")
     def get_trending_searches(self, count=20):
         """
         Отримати трендові пошуки з кешуванням для зменшення запитів
@@ -426,7 +802,7 @@ class TrendAnalyzer:
         
         if (self.trends_cache['trends'] and 
             current_time - self.trends_cache['timestamp'] < cache_lifetime):
-            logger.info("Використовуємо кешовані тренди")
+            log_event('trends.cache_hit', logging.INFO, "Використовуємо кешовані тренди")
             return self.trends_cache['trends'][:count]
         
         # Якщо кеш не актуальний, отримуємо нові тренди
@@ -449,6 +825,7 @@ class TrendAnalyzer:
         return related_queries
     
     @retry(tries=3, delay=2, backoff=2)
+    @profiled("analyzer.generate_video_ideas", retry_tries=3)
     def generate_video_ideas(self, keyword, count=3, category=None):
         """
         Генерувати ідеї для відео на основі ключового слова
@@ -459,12 +836,12 @@ class TrendAnalyzer:
         :return: згенерований текст ідей
         """
         try:
-            logger.info(f"Генерація {count} ідей для відео на основі '{keyword}'")
+            logger.info("Генерація %s ідей для відео на основі '%s'", count, keyword)
             
             # Отримання трендів для контексту
             trends = self.get_trending_searches(count=10)
-            # Логуємо тренди для аналізу
-            logger.info(f"Поточні тренди: {trends}")
+            # Логуємо тренди для аналізу (лише на рівні debug)
+            log_event('trends.list', logging.DEBUG, "Поточні тренди: %s", trends)
             
             # Отримання пов'язаних запитів для збагачення контексту
             related = self.get_related_queries(keyword)
@@ -572,23 +949,25 @@ class TrendAnalyzer:
             """
             
             # Використовуємо SDK для генерації відповіді
-            response = self.model.generate_content(
-                contents=prompt,
-                generation_config=generation_config,
-                safety_settings=safety_settings
-            )
+            with profile_span("gemini.generate_content"):
+                response = self.model.generate_content(
+                    contents=prompt,
+                    generation_config=generation_config,
+                    safety_settings=safety_settings
+                )
             
             # Отримуємо текст відповіді
-            if hasattr(response, 'candidates') and response.candidates:
-                content = response.candidates[0].content.parts[0].text
-            else:
-                content = response.text
+            with profile_span("gemini.parse_response"):
+                if hasattr(response, 'candidates') and response.candidates:
+                    content = response.candidates[0].content.parts[0].text
+                else:
+                    content = response.text
             
-            logger.info(f"Ідеї успішно згенеровано для '{keyword}'")
+            logger.info("Ідеї успішно згенеровано для '%s'", keyword)
             return content
             
         except Exception as e:
-            logger.error(f"Помилка генерації ідей для '{keyword}': {str(e)}")
+            logger.error("Помилка генерації ідей для '%s': %s", keyword, e)
             raise
 
 # Створення Flask додатку
@@ -599,6 +978,18 @@ app = Flask(__name__,
 # Налаштування CORS
 CORS(app)
 
+@app.before_request
+def _assign_request_id():
+    """Ідентифікатор запиту для кореляції записів логу (з заголовка X-Request-ID або новий)"""
+    request_id = request.headers.get('X-Request-ID', '')
+    g.request_id = request_id if re.fullmatch(r'[\w.-]{1,64}', request_id) else uuid.uuid4().hex
+
+@app.after_request
+def _add_request_id_header(response):
+    """Повертаємо ідентифікатор запиту клієнту"""
+    response.headers['X-Request-ID'] = g.get('request_id', '')
+    return response
+
 # Глобальна змінна для аналізатора трендів
 analyzer = None
 
@@ -647,7 +1038,7 @@ def get_trends():
         trends = analyzer.get_trending_searches(count=count)
         return jsonify({"trends": trends})
     except Exception as e:
-        logger.error(f"Помилка при отриманні трендів: {str(e)}")
+        logger.error("Помилка при отриманні трендів: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/analyze', methods=['POST'])
@@ -667,22 +1058,104 @@ def analyze_trend():
         if not keyword:
             return jsonify({"error": "Ключове слово не вказано"}), 400
         
-        # Генерація ідей для відео
+        # Генерація ідей для відео (кожна спроба @retry - окремий етап профілю)
         ideas = analyzer.generate_video_ideas(
             keyword=keyword,
             count=count,
             category=category
         )
         
-        return jsonify({
-            "keyword": keyword,
-            "category": category,
-            "ideas": ideas
-        })
+        with profile_span("response.jsonify"):
+            return jsonify({
+                "keyword": keyword,
+                "category": category,
+                "ideas": ideas
+            })
     except Exception as e:
-        logger.error(f"Помилка при аналізі тренду: {str(e)}")
+        logger.error("Помилка при аналізі тренду: %s", e)
         return jsonify({"error": str(e)}), 500
 
+def _is_profile_admin():
+    """Перевірка адмін-токена профілювання в заголовку X-Profile-Token або параметрі profile"""
+    if not PROFILE_ADMIN_TOKEN:
+        return False
+    # Порівнюємо байти: compare_digest не приймає рядки з не-ASCII символами.
+    # Заголовки WSGI декодовано як latin-1, тому повертаємо їм початкові байти
+    header_token = request.headers.get('X-Profile-Token')
+    if header_token:
+        token = header_token.encode('latin-1', 'replace')
+    else:
+        token = request.args.get('profile', '').encode('utf-8')
+    return bool(token) and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN.encode('utf-8'))
+
+def _start_request_profile():
+    """
+    Запуск профілювання запиту за адмін-токеном або за частотою семплування.
+    Будь-яка помилка лише вимикає профілювання, не впливаючи на сам запит.
+    """
+    if request.path.startswith(('/debug/', '/static/')):
+        return
+    try:
+        if not (_is_profile_admin() or random.random() < PROFILE_SAMPLE_RATE):
+            return
+        profile = RequestProfile(f"{request.method} {request.path}")
+        profile.start()
+        _profile_local.profile = profile
+    except Exception as e:
+        _profile_local.profile = None
+        logger.warning("Не вдалося запустити профілювання запиту: %s", e)
+
+def _finish_request_profile(response):
+    """Зупинка профілювання та збереження результатів"""
+    profile = getattr(_profile_local, 'profile', None)
+    if profile is None:
+        return response
+    _profile_local.profile = None
+    profile.stop()
+    try:
+        profile.save()
+        response.headers['X-Profile-Id'] = profile.id
+    except Exception as e:
+        logger.error("Помилка збереження профілю %s: %s", profile.id, e)
+    return response
+
+def _discard_request_profile(exc):
+    """Зупинка семплера, якщо запит завершився необробленим винятком"""
+    profile = getattr(_profile_local, 'profile', None)
+    if profile is not None:
+        _profile_local.profile = None
+        profile.stop()
+
+# Хуки реєструються лише коли профілювання увімкнено, інакше запити не мають жодних накладних витрат
+if PROFILING_ENABLED:
+    app.before_request(_start_request_profile)
+    app.after_request(_finish_request_profile)
+    app.teardown_request(_discard_request_profile)
+    logger.info(f"Профілювання запитів увімкнено (частота семплування: {PROFILE_SAMPLE_RATE}, каталог: {PROFILE_DIR})")
+
+@app.route('/debug/profiles', methods=['GET'])
+def list_profiles():
+    """Список збережених профілів запитів"""
+    if not _is_profile_admin():
+        return jsonify({"error": "Доступ заборонено"}), 403
+    
+    profiles = {}
+    if os.path.isdir(PROFILE_DIR):
+        for filename in sorted(os.listdir(PROFILE_DIR), reverse=True):
+            profile_id, _, kind = filename.partition('.')
+            entry = profiles.setdefault(profile_id, {"id": profile_id, "files": {}})
+            entry["files"][kind.split('.', 1)[0]] = f"/debug/profiles/{filename}"
+    
+    return jsonify({"profiles": list(profiles.values())})
+
+@app.route('/debug/profiles/<path:filename>', methods=['GET'])
+def download_profile(filename):
+    """Завантаження файлу профілю (speedscope або collapsed stacks)"""
+    if not _is_profile_admin():
+        return jsonify({"error": "Доступ заборонено"}), 403
+    
+    return send_from_directory(PROFILE_DIR, filename, as_attachment=True)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Бенчмарк накладних витрат логування на один запит /api/analyze
+
+Порівнює попередній підхід (f-рядки, синхронний StreamHandler у потоці запиту)
+з поточним (ліниве форматування, великі дані на рівні debug, запис через чергу).
+Вимірюється лише час у потоці запиту.
+
+Запуск: python bench_logging.py [кількість_запитів]
+"""
+import os
+import sys
+import time
+import logging
+
+import app
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+# Дані, схожі на реальний запит
+TRENDS = [f"як підготуватися до відключення світла {i}" for i in range(10)]
+RESULTS = {f"key_{i}": None for i in range(12)}
+TOP = [f"пов'язаний запит {i}" for i in range(10)]
+RISING = [f"зростаючий запит {i}" for i in range(10)]
+KEYWORD = "як зробити генератор"
+
+
+def baseline_request(logger):
+    """Логування одного запиту так, як це було зроблено раніше"""
+    logger.info(f"Генерація {3} ідей для відео на основі '{KEYWORD}'")
+    logger.info("Використовуємо кешовані тренди")
+    logger.info(f"Поточні тренди: {TRENDS}")
+    logger.info(f"Пошук пов'язаних запитів для '{KEYWORD}' через SerpAPI")
+    logger.info(f"Отримано відповідь від SerpAPI: {RESULTS.keys()}")
+    logger.info(f"Знайдено {len(TOP)} топових та {len(RISING)} зростаючих запитів")
+    logger.info(f"Пов'язані топові запити: {TOP[:5]}")
+    logger.info(f"Пов'язані зростаючі запити: {RISING[:5]}")
+    logger.info(f"Ідеї успішно згенеровано для '{KEYWORD}'")
+
+
+def current_request(logger):
+    """Логування одного запиту так, як це зроблено в app.py"""
+    logger.info("Генерація %s ідей для відео на основі '%s'", 3, KEYWORD)
+    app.log_event('trends.cache_hit', logging.INFO, "Використовуємо кешовані тренди")
+    app.log_event('trends.list', logging.DEBUG, "Поточні тренди: %s", TRENDS)
+    app.log_event('serpapi.request', logging.INFO, "Пошук пов'язаних запитів для '%s' через SerpAPI", KEYWORD)
+    app.log_event('serpapi.response', logging.DEBUG, "Отримано відповідь від SerpAPI: %s", RESULTS.keys())
+    logger.info("Знайдено %d топових та %d зростаючих запитів", len(TOP), len(RISING))
+    app.log_event('serpapi.related_queries', logging.DEBUG, "Пов'язані топові запити: %s", TOP[:5])
+    app.log_event('serpapi.related_queries', logging.DEBUG, "Пов'язані зростаючі запити: %s", RISING[:5])
+    logger.info("Ідеї успішно згенеровано для '%s'", KEYWORD)
+
+
+def measure(request_func, logger):
+    """Середній час логування одного запиту в мікросекундах"""
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        request_func(logger)
+    return (time.perf_counter() - started) / REQUESTS * 1e6
+
+
+def main():
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        # Попередній підхід: синхронний StreamHandler у потоці запиту
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        stream_handler = logging.StreamHandler(devnull)
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        root.addHandler(stream_handler)
+        root.setLevel(logging.INFO)
+        baseline = measure(baseline_request, logging.getLogger("TrendAnalyzer"))
+
+        results = {"до змін": baseline}
+        for log_format in ('text', 'json'):
+            app.configure_logging(log_format=log_format, level='INFO', stream=devnull, sample_rates={})
+            results[f"черга, {log_format}"] = measure(current_request, logging.getLogger("TrendAnalyzer"))
+
+        # Дописуємо чергу до закриття devnull
+        app._stop_log_listener()
+
+    print(f"Запитів: {REQUESTS}")
+    for name, value in results.items():
+        saved = baseline - value
+        print(f"{name:<16} {value:8.1f} мкс/запит  (економія {saved:7.1f} мкс, {saved / baseline * 100:5.1f}%)")
+
+
+if __name__ == '__main__':
+    main()